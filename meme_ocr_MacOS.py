@@ -1,207 +1,179 @@
-import os
-import io
-import uuid
+"""macOS entry point for the shared meme OCR + TTS pipeline.
+
+Uses the system's text-to-speech engine: AVSpeechSynthesizer in-process
+when PyObjC's AVFoundation bindings are installed, otherwise the built-in
+`say` command (Alex voice), falling back to Balcon when run on Windows.
+"""
+
 import asyncio
-import subprocess
-from pathlib import Path
+import os
+import shutil
 import sys
+import threading
+from pathlib import Path
 
 import click
-from tqdm import tqdm
-from google.cloud import vision
-from PIL import Image
-
-# -------------------------------------------------------------------------
-# 1. Load the Google Cloud Vision credential file.
-#    Make sure keys.json has Vision API access.
-# -------------------------------------------------------------------------
-credential_path = Path(__file__).parent / "keys.json"
-vision_client = vision.ImageAnnotatorClient.from_service_account_json(str(credential_path))
-
-
-# -------------------------------------------------------------------------
-# 2. This function calls a Text-to-Speech command to generate a WAV file.
-#    On macOS, it uses the built-in `say` command.
-#    On Windows (if needed), it falls back to Balcon (currently configured for Windows).
-# -------------------------------------------------------------------------
-def generate_audio(text: str, output_file: Path):
-    """
-    Generates a WAV file from `text` using the system's Text-to-Speech engine.
-    For macOS, it uses the built-in `say` command.
-    For Windows, it uses Balcon (if available).
-    """
-    if sys.platform == "darwin":
-        # macOS: use the built-in `say` command.
-        # Customize the voice if desired; for example, use "Alex" or "Samantha".
-        voice_name = "Alex"
-        cmd = [
+
+import core
+
+try:
+    # Optional in-process engine: synthesizing through AVSpeechSynthesizer
+    # skips the fork+exec and voice-data load that `say` pays per clip.
+    # Needs pyobjc-framework-AVFoundation; we fall back to `say` without it.
+    from AVFoundation import (AVAudioFile, AVSpeechSynthesisVoice,
+                              AVSpeechSynthesizer, AVSpeechUtterance)
+    from Foundation import NSURL
+except ImportError:
+    AVSpeechSynthesizer = None
+
+SAY_VOICE_NAME = "Alex"
+AVSPEECH_VOICE_ID = "com.apple.speech.synthesis.voice.Alex"
+
+
+async def _generate_audio_say(text: str, output_file: Path):
+    """Render `text` to a WAV with the built-in `say` command (macOS)."""
+    if core.cache_enabled:
+        cached = core.cached_tts_path(SAY_VOICE_NAME, text)
+        if cached.exists():
+            shutil.copy(cached, output_file)
+            return None
+    # Spawn `say` straight from the event loop; no worker thread needed
+    # just to sit in waitpid while the synthesis runs.
+    try:
+        proc = await asyncio.create_subprocess_exec(
             "say",
-            "-v", voice_name,
+            "-v", SAY_VOICE_NAME,
             text,
             "-o", str(output_file),
-            "--data-format=WAVE"
-        ]
-        try:
-            subprocess.run(cmd, check=True)
-        except Exception as e:
-            print(f"Error generating audio on macOS for {output_file}: {e}")
-    elif sys.platform == "win32":
-        # Windows: use Balcon (as in the original code).
-        balcon_exe = r"C:\balcon\balcon.exe"  # adjust path if needed
-        voice_name = "ScanSoft Daniel_Full_22kHz"
-        cmd = [
-            balcon_exe,
-            "-n", voice_name,      # which voice to use
-            "-t", text,            # text to speak
-            "-w", str(output_file) # output WAV path
-        ]
-        CREATE_NO_WINDOW = 0x08000000
-        try:
-            subprocess.run(cmd, check=True, creationflags=CREATE_NO_WINDOW)
-        except Exception as e:
-            print(f"Error generating audio via Balcon for {output_file}: {e}")
-    else:
-        print("Unsupported platform for TTS.")
-        
+            "--data-format=WAVE",
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await proc.communicate()
+    except Exception as e:
+        return str(e)
+    if proc.returncode != 0:
+        return stderr.decode(errors="replace").strip() or f"say exited with {proc.returncode}"
+    if core.cache_enabled and output_file.exists():
+        shutil.copy(output_file, core.cached_tts_path(SAY_VOICE_NAME, text))
+    return None
 
-def is_image(file_path: Path) -> bool:
-    """Check if the file is an image using Pillow."""
-    try:
-        with Image.open(file_path):
-            return True
-    except IOError:
-        return False
 
+if AVSpeechSynthesizer is not None:
+    # One synthesizer for the whole run; the engine serializes utterances
+    # internally, so a lock keeps each write callback paired with its call.
+    _avspeech_synth = AVSpeechSynthesizer.alloc().init()
+    _avspeech_lock = threading.Lock()
 
-def detect_text(image_path: Path) -> str:
-    """Detect text in the file using Google Vision API."""
-    try:
-        with open(image_path, "rb") as image_file:
-            content = image_file.read()
-        image = vision.Image(content=content)
-        response = vision_client.text_detection(image=image)
 
-        if response.error.message:
-            raise Exception(f"Error with Google Vision API: {response.error.message}")
+def _avspeech_render(text: str, output_file: Path):
+    """
+    Render `text` to `output_file` in-process through AVSpeechSynthesizer.
+    Blocks until the final (zero-length) buffer arrives; meant to be called
+    from a worker thread. Returns None on success, else an error message.
+    """
+    utterance = AVSpeechUtterance.speechUtteranceWithString_(text)
+    voice = AVSpeechSynthesisVoice.voiceWithIdentifier_(AVSPEECH_VOICE_ID)
+    if voice is not None:
+        utterance.setVoice_(voice)
+    done = threading.Event()
+    state = {"file": None, "error": None}
+
+    def on_buffer(buffer):
+        # A zero-length buffer marks the end of the utterance.
+        if buffer.frameLength() == 0:
+            state["file"] = None  # drop the reference to flush/close
+            done.set()
+            return
+        try:
+            if state["file"] is None:
+                # AVAudioFile picks the container from the .wav extension
+                # and the sample format from the first buffer's settings.
+                audio_file, err = AVAudioFile.alloc().initForWriting_settings_error_(
+                    NSURL.fileURLWithPath_(str(output_file)),
+                    buffer.format().settings(),
+                    None,
+                )
+                if audio_file is None:
+                    raise RuntimeError(err)
+                state["file"] = audio_file
+            ok, err = state["file"].writeFromBuffer_error_(buffer, None)
+            if not ok:
+                raise RuntimeError(err)
+        except Exception as e:
+            state["error"] = str(e)
+            state["file"] = None
+            done.set()
+
+    with _avspeech_lock:
+        _avspeech_synth.writeUtterance_toBufferCallback_(utterance, on_buffer)
+        if not done.wait(timeout=120):
+            return f"AVSpeechSynthesizer timed out for {output_file.name}"
+    return state["error"]
+
+
+async def _generate_audio_avspeech(text: str, output_file: Path):
+    """Render `text` in-process via AVFoundation (macOS, PyObjC installed)."""
+    if core.cache_enabled:
+        cached = core.cached_tts_path(SAY_VOICE_NAME, text)
+        if cached.exists():
+            shutil.copy(cached, output_file)
+            return None
+    err = await asyncio.to_thread(_avspeech_render, text, output_file)
+    if err is not None:
+        return err
+    if core.cache_enabled and output_file.exists():
+        shutil.copy(output_file, core.cached_tts_path(SAY_VOICE_NAME, text))
+    return None
+
+
+async def _generate_audio_balcon(text: str, output_file: Path):
+    """Render through the shared blocking Balcon helper (Windows)."""
+    return await asyncio.to_thread(core.generate_audio_balcon, text, output_file)
+
+
+async def _generate_audio_unsupported(text: str, output_file: Path):
+    return "Unsupported platform for TTS."
+
+
+# Resolve the platform once at import instead of re-walking the
+# sys.platform chain on every clip in the parallel loop; swapping in a
+# different engine is now a one-line rebind.
+if sys.platform == "darwin":
+    if AVSpeechSynthesizer is not None:
+        generate_audio = _generate_audio_avspeech
+    else:
+        generate_audio = _generate_audio_say
+elif sys.platform == "win32":
+    generate_audio = _generate_audio_balcon
+else:
+    generate_audio = _generate_audio_unsupported
 
-        texts = response.text_annotations
-        if not texts:
-            return ""
 
-        # Combine multiline text into one line
-        full_text = texts[0].description.strip().replace("\n", " ")
-        return full_text
-    except Exception as e:
-        print(f"Error detecting text for {image_path}: {e}")
-        return ""
+class SayTts(core.TtsBackend):
+    """System TTS backend: macOS `say` (Alex voice), Balcon on Windows."""
 
+    # Local synthesis is CPU-bound; size the pool to the machine.
+    default_workers = os.cpu_count() or 4
 
-async def process_images(folder_path: str) -> None:
-    """
-    Processes all images in the selected folder:
-      1) Detect text from each image (Google Vision)
-      2) Write them to 'detected_texts.txt' with blank lines separating entries
-         (image_name:\ntext)
-      3) Let user edit the file in a text editor (TextEdit on macOS, Notepad on Windows)
-      4) Parse corrected text and generate audio with system TTS (macOS `say` or Windows Balcon)
-    """
-    # Create a unique output directory
-    output_dir = Path(folder_path) / f"output-{uuid.uuid4().hex[:8]}"
-    audio_dir = output_dir / "audio"
-    os.makedirs(audio_dir, exist_ok=True)
-
-    # Collect image files
-    image_files = [
-        Path(root) / file
-        for root, _, files in os.walk(folder_path)
-        for file in files
-        if is_image(Path(root) / file)
-    ]
-
-    print(f"Total images found: {len(image_files)}\n")
-
-    # Step 1: OCR text detection
-    detected_texts = {}
-    for idx, image_path in enumerate(image_files, start=1):
-        print(f"Detecting text in image {idx}/{len(image_files)}: {image_path.name}")
-        with tqdm(total=100, desc=f"Scanning {image_path.name}", leave=False) as pbar:
-            text = detect_text(image_path)
-            pbar.update(100)
-        if text:
-            detected_texts[image_path.stem] = text
-
-    # Step 2: Save to detected_texts.txt
-    txt_file = output_dir / "detected_texts.txt"
-    with open(txt_file, "w", encoding="utf-8") as f:
-        for image_name, text in detected_texts.items():
-            f.write(f"{image_name}:\n{text}\n\n")
-
-    print(f"\nDetected texts saved to: {txt_file}")
-    print("Please review and edit the text file before proceeding.\n")
-    print("Format:\n"
-          "filename:\n"
-          "Corrected text on one (or more) line(s)\n\n"
-          "Then a blank line.\n")
-
-    # Step 3: Open in a text editor
-    try:
-        if sys.platform == "win32":
-            subprocess.call(["notepad", str(txt_file)])
-        elif sys.platform == "darwin":
-            subprocess.call(["open", "-e", str(txt_file)])
-        else:
-            print("Unsupported platform for opening a text editor. Please open the file manually:")
-            print(txt_file)
-    except FileNotFoundError:
-        print("Could not open the editor automatically. Please open and edit the file manually:")
-        print(txt_file)
-
-    input("Press Enter after editing and closing the text file... ")
-
-    # Step 4: Read corrected text
-    corrected_texts = {}
-    with open(txt_file, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    i = 0
-    while i < len(lines):
-        line = lines[i].rstrip()
-        if not line:
-            i += 1
-            continue
-        # If line ends with ':', it's an image name
-        if line.endswith(":"):
-            image_name = line[:-1].strip()
-            i += 1
-            text_line = ""
-            if i < len(lines):
-                text_line = lines[i].rstrip()
-                i += 1
-            corrected_texts[image_name] = text_line
-            # skip blank lines
-            while i < len(lines) and not lines[i].strip():
-                i += 1
-        else:
-            i += 1
-
-    # Step 5: Generate audio with system TTS
-    print("\nGenerating audio...")
-    total_items = len(corrected_texts)
-    for idx, (image_name, text) in enumerate(corrected_texts.items(), start=1):
-        print(f"Audio {idx}/{total_items}: {image_name}.wav")
-        audio_file = audio_dir / f"{image_name}.wav"
-        with tqdm(total=100, desc=f"Audio for {image_name}", leave=False) as pbar:
-            generate_audio(text, audio_file)
-            pbar.update(100)
-
-    print(f"\nDone! Outputs in {output_dir}")
+    async def synthesize_one(self, image_name, text, audio_dir, semaphore):
+        async with semaphore:
+            err = await generate_audio(text, audio_dir / f"{image_name}.wav")
+        return image_name, err
 
 
 @click.command()
 @click.argument("folder_path", type=click.Path(exists=True, file_okay=False))
-def main(folder_path):
-    asyncio.run(process_images(folder_path))
+@click.option("--workers", default=None, type=int,
+              help="Number of parallel audio-generation workers "
+                   "(defaults to the CPU count; local synthesis is CPU-bound).")
+@click.option("--no-edit", is_flag=True,
+              help="Skip the manual review step and pipeline OCR straight into audio generation.")
+@click.option("--no-cache", is_flag=True,
+              help="Bypass the on-disk OCR/TTS cache and always call the APIs.")
+def main(folder_path, workers, no_edit, no_cache):
+    core.run(SayTts(), folder_path, workers=workers,
+             edit=not no_edit, use_cache=not no_cache)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()